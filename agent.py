@@ -3,6 +3,51 @@ from itertools import combinations
 from collections import deque
 from utils import flatten, get_direction, is_facing_monster
 
+QUERY_TYPES = ["pit_in_room", "monster_in_room", "no_pit_in_room", "no_monster_in_room"]
+
+
+# TOPOLOGY
+class Topology:
+    """Incremental bounds of the cave along each axis: the open interval
+    between the wall lines revealed by bumps (None while still unbounded).
+    Membership checks are O(1) regardless of the size of the cave."""
+    def __init__(self):
+        self.wall_min = [None, None]  # [x, y] coordinate of the low wall line
+        self.wall_max = [None, None]  # [x, y] coordinate of the high wall line
+
+
+    def record_bump(self, room, direction):
+        """Close the possible bounds on the side where a bump was felt."""
+        match direction:
+            case "up":
+                self.wall_max[1] = room[1] + 1
+            case "down":
+                self.wall_min[1] = room[1] - 1
+            case "left":
+                self.wall_min[0] = room[0] - 1
+            case "right":
+                self.wall_max[0] = room[0] + 1
+
+
+    def in_bounds(self, room):
+        """Return False only if a known wall line excludes the room."""
+        for axis in (0, 1):
+            lo, hi = self.wall_min[axis], self.wall_max[axis]
+            if lo is not None and room[axis] <= lo:
+                return False
+            if hi is not None and room[axis] >= hi:
+                return False
+        return True
+
+
+    def is_wall(self, room):
+        return not self.in_bounds(room)
+
+
+    def prune(self, rooms):
+        """Remove rooms beyond the known walls from a set in place."""
+        rooms.difference_update({r for r in rooms if not self.in_bounds(r)})
+
 
 # KNOWLEDGE BASE
 class KB:
@@ -15,23 +60,43 @@ class KB:
         self.bump = dict()  # {loc: direction} where bump has been perceived
         self.gasp = False  # True if gasp has been perceived
         self.scream = False  # True if scream has been perceived
-        self.walls = set()  # set of rooms (x, y) that are known to be walls
+        self.topology = Topology()  # bounds of the cave revealed by bumps
         self.pits = set()  # set of rooms (x, y) that are known to be pits
         self.no_pit_rooms = set()    # set of rooms (x, y) that are known to be not pits
         self.no_monster_rooms = set()  # set of rooms (x, y) that are known to be not walls
         self.monster = None  # room (x, y) that is known to be the Monster
         self.luke = None  # room (x, y) that is known to be Luke
         self.current_path = deque() # path to target that R2D2 should go in current state
+        self.generation = 0  # incremented whenever the KB learns something new
+        self.signature = None  # summary of the KB when the generation was last updated
 
 
     @property
     def unvisited_rooms(self):
         # dynamically update unvisited set
-        return self.safe_rooms - self.visited_rooms - self.walls
+        return self.safe_rooms - self.visited_rooms
 
 
     def update_safe_room(self):
-        self.safe_rooms -= self.walls
+        """Drop every room the topology has ruled out from the KB."""
+        for rooms in (self.all_rooms, self.safe_rooms, self.pits,
+                      self.no_pit_rooms, self.no_monster_rooms):
+            self.topology.prune(rooms)
+        if self.monster and self.topology.is_wall(self.monster):
+            self.monster = None
+
+
+    def update_generation(self):
+        """Increment the generation if the KB changed since the last call. The
+        sets only grow apart from pruning beyond walls (which needs a new bump)
+        and clearing stench (which needs a scream), so their sizes are enough."""
+        signature = (len(self.all_rooms), len(self.safe_rooms), len(self.visited_rooms),
+                     len(self.stench), len(self.breeze), len(self.bump), len(self.pits),
+                     len(self.no_pit_rooms), len(self.no_monster_rooms),
+                     self.monster, self.luke, self.gasp, self.scream)
+        if signature != self.signature:
+            self.signature = signature
+            self.generation += 1
 
 
 # AGENT
@@ -50,6 +115,8 @@ class Agent:
             "left": (-1, 0),
             "right": (1, 0)
         }
+        self.inference_engine = "enumeration"  # key of Agent.resolution_engines
+        self.planner = None  # LookaheadPlanner that replaces the priority list when set
         self.KB = KB(self)
 
 
@@ -77,8 +144,9 @@ class Agent:
         x, y = room[0], room[1]
         for _, (dx, dy) in self.orientation_to_delta.items():
             nx, ny = dx + x, dy + y
-            adj.add((nx, ny))
-        return adj - self.KB.walls
+            if self.KB.topology.in_bounds((nx, ny)):
+                adj.add((nx, ny))
+        return adj
 
 
     def record_percepts(self, sensed_percepts, current_location):
@@ -101,8 +169,7 @@ class Agent:
         if "bump" in present_percepts:
             direction = get_direction(self.degrees)
             self.KB.bump[current_location] = direction
-            dx, dy = self.orientation_to_delta[direction]
-            self.KB.walls.add((current_location[0] + dx, current_location[1] + dy))
+            self.KB.topology.record_bump(current_location, direction)
         if "scream" in present_percepts:
             self.KB.scream = True
 
@@ -122,7 +189,7 @@ class Agent:
         Then use itertools.combinations to return the set of possible worlds,
         or all combinations of possible pit and monster locations."""
 
-        unknown_rooms = self.KB.all_rooms - self.KB.visited_rooms - self.KB.walls - self.KB.safe_rooms
+        unknown_rooms = self.KB.all_rooms - self.KB.visited_rooms - self.KB.safe_rooms
         world = set()
         for k in range(len(unknown_rooms) + 1):
             pit_rooms = list(combinations(unknown_rooms, k))
@@ -216,8 +283,7 @@ class Agent:
                 adjacent = self.adjacent_rooms(stench_room)
                 possible_monster_rooms = {r for r in adjacent if
                                         r not in self.KB.safe_rooms and
-                                        r not in self.KB.pits and
-                                        r not in self.KB.walls}
+                                        r not in self.KB.pits}
                 if len(possible_monster_rooms) == 1:
                     monster_room = possible_monster_rooms.pop()
                     if self.KB.monster != monster_room:
@@ -229,8 +295,7 @@ class Agent:
                 adjacent = self.adjacent_rooms(breeze_room)
                 possible_pit_rooms = {r for r in adjacent if
                                       r not in self.KB.safe_rooms and
-                                      r != self.KB.monster and
-                                      r not in self.KB.walls}
+                                      r != self.KB.monster}
                 if len(possible_pit_rooms) == 1:
                     pit_room = possible_pit_rooms.pop()
                     if pit_room not in self.KB.pits:
@@ -238,58 +303,103 @@ class Agent:
 
 
     def infer_wall_locations(self):
-        """If a bump is perceived, infer wall locations along the entire known
-        length of the room."""
-        min_x = min(self.KB.all_rooms, key=lambda x: x[0])[0]
-        max_x = max(self.KB.all_rooms, key=lambda x: x[0])[0]
-        min_y = min(self.KB.all_rooms, key=lambda x: x[1])[1]
-        max_y = max(self.KB.all_rooms, key=lambda x: x[1])[1]
-        for room, orientation in self.KB.bump.items():
-            match orientation:
-                case "up":
-                    for x in range(min_x, max_x + 1, 1):
-                        self.KB.walls.add((x, room[1] + 1))
-                case "down":
-                    for x in range(min_x, max_x + 1, 1):
-                        self.KB.walls.add((x, room[1] - 1))
-                case "left":
-                    for y in range(min_y, max_y + 1, 1):
-                        self.KB.walls.add((room[0] - 1, y))
-                case "right":
-                    for y in range(min_y, max_y + 1, 1):
-                        self.KB.walls.add((room[0] + 1, y))
-
+        """If a bump is perceived, the topology already holds the wall line on
+        that side, so prune every room beyond it from the KB, and drop the
+        current path if it led into one of them."""
         self.KB.update_safe_room()
+        if self.KB.current_path and not self.KB.safe_rooms.issuperset(self.KB.current_path):
+            self.KB.current_path = None
 
 
-    def resolution_algorithm(self):
-        """use backward-chaining resolution in logical inference, when environment is partially observable, writing as
-        (A /cup B) and (/not B /cup C) implies =>> (A /cup C). In other words, when KB model is subset
-        of query model, then we can conclude the room is safe"""
+    def record_entailments(self, entailed):
+        """Update KB.pits, KB.monster, KB.no_pit_rooms and KB.no_monster_rooms
+        from the (query, room) pairs entailed by the KB, then mark rooms with
+        both no pit and no monster as safe."""
         query_handlers = {
             "pit_in_room": lambda room: self.KB.pits.add(room),
             "monster_in_room": lambda room: setattr(self.KB, 'monster', room),
             "no_pit_in_room": lambda room: (self.KB.no_pit_rooms.add(room), inferred_rooms.add(room)),
             "no_monster_in_room": lambda room: (self.KB.no_monster_rooms.add(room), inferred_rooms.add(room))
         }
-        query_types = ["pit_in_room", "monster_in_room", "no_pit_in_room", "no_monster_in_room"]
+        inferred_rooms = set()
+        for query, room in entailed:
+            handler = query_handlers[query]
+            handler(room)
+
+        new_safe_rooms = {room for room in inferred_rooms
+                          if room in self.KB.no_pit_rooms and room in self.KB.no_monster_rooms}
+        self.KB.safe_rooms.update(new_safe_rooms)
+
 
+    def resolution_algorithm(self):
+        """use backward-chaining resolution in logical inference, when environment is partially observable, writing as
+        (A /cup B) and (/not B /cup C) implies =>> (A /cup C). In other words, when KB model is subset
+        of query model, then we can conclude the room is safe"""
         curr_location = self.loc
         possible_world = self.enumerate_possible_worlds()
         KB_set = self.find_model_of_KB(possible_world)
-        inferred_rooms = set()
+        if not KB_set:
+            # an empty model would vacuously entail every query
+            return
         adj_rooms = self.adjacent_rooms(curr_location) - self.KB.safe_rooms
 
-        for query in query_types:
+        entailed = []
+        for query in QUERY_TYPES:
             for room in adj_rooms:
                 query_set = self.find_model_of_query(query, room, possible_world)
                 if KB_set.issubset(query_set):
-                    handler = query_handlers[query]
-                    handler(room)
+                    entailed.append((query, room))
+        self.record_entailments(entailed)
+
+
+    def consistent_rooms(self):
+        """Return (pit_rooms, monster_rooms, breeze) describing the model of
+        the KB: every (pits, monster) where pits is a subset of pit_rooms,
+        non-empty if breeze, and monster is in monster_rooms, where tuple()
+        stands for no monster, and not among the pits."""
+        unknown_rooms = self.KB.all_rooms - self.KB.visited_rooms - self.KB.safe_rooms
+        pit_rooms = {r for r in unknown_rooms if self.pit_room_is_consistent_with_KB(r)}
+        monster_rooms = {r for r in unknown_rooms if self.monster_room_is_consistent_with_KB(r)}
+        if self.monster_room_is_consistent_with_KB(tuple()):
+            monster_rooms.add(tuple())
+        return pit_rooms, monster_rooms, bool(self.KB.breeze)
+
+
+    def closed_form_resolution(self):
+        """Same conclusions as resolution_algorithm without enumerating worlds.
+        A query is entailed when no model of the KB contradicts it, which only
+        needs the sizes of the sets returned by consistent_rooms."""
+        pit_rooms, monster_rooms, breeze = self.consistent_rooms()
+
+        def has_pits(monster, room=None):
+            # some pit set avoids the monster (and room), empty if no breeze
+            excluded = {monster, room} & pit_rooms
+            return not breeze or len(pit_rooms) > len(excluded)
+
+        if not any(has_pits(m) for m in monster_rooms):
+            # an empty model would vacuously entail every query
+            return
+        counterexample = {
+            "pit_in_room": lambda room: any(has_pits(m, room) for m in monster_rooms),
+            "monster_in_room": lambda room: any(has_pits(m) for m in monster_rooms if m != room),
+            "no_pit_in_room": lambda room: room in pit_rooms and bool(monster_rooms - {room}),
+            "no_monster_in_room": lambda room: room in monster_rooms and has_pits(room)
+        }
+        adj_rooms = self.adjacent_rooms(self.loc) - self.KB.safe_rooms
 
-        new_safe_rooms = {room for room in inferred_rooms
-                          if room in self.KB.no_pit_rooms and room in self.KB.no_monster_rooms}
-        self.KB.safe_rooms.update(new_safe_rooms)
+        entailed = []
+        for query in QUERY_TYPES:
+            for room in adj_rooms:
+                if not counterexample[query](room):
+                    entailed.append((query, room))
+        self.record_entailments(entailed)
+
+
+    # Level III implementations, selected with Agent.inference_engine
+    resolution_engines = {
+        "enumeration": resolution_algorithm,
+        "closed_form": closed_form_resolution
+    }
 
 
     def inference_algorithm(self):
@@ -319,7 +429,6 @@ class Agent:
         curr_location = self.loc
         if curr_location in self.KB.bump:
             self.infer_wall_locations()
-            self.KB.current_path = None
         if curr_location not in self.KB.breeze and curr_location not in self.KB.stench:
             adj_rooms = self.adjacent_rooms(curr_location)
             self.KB.safe_rooms.update(adj_rooms)
@@ -333,8 +442,8 @@ class Agent:
         self.infer_single_room()
 
         # Level III: resolution algorithm
-        # Define mapping of query types to actions
-        self.resolution_algorithm()
+        self.resolution_engines[self.inference_engine](self)
+        self.KB.update_generation()
 
     def all_safe_next_actions(self):
         """Define R2D2's valid and safe next actions based on his current
@@ -372,7 +481,7 @@ class Agent:
 
             x, y = current
             for nx, ny in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
-                if (nx, ny) not in visited and (nx, ny) in self.KB.safe_rooms and (nx, ny) not in self.KB.walls:
+                if (nx, ny) not in visited and (nx, ny) in self.KB.safe_rooms:
                     visited.add((nx, ny))
                     queue.append(((nx, ny), path + [(nx, ny)]))
         return None
@@ -417,6 +526,14 @@ class Agent:
                 return random.choice(["left", "right"])
 
         needed_dir = direction_map.get((nx - x, ny - y))
+        if needed_dir is None:
+            # R2 wandered off the path after reaching its last target, plan it again
+            target = self.KB.current_path[-1]
+            if target != self.loc and self.bfs_path(self.loc, target):
+                self.current_path_setter(target)
+                return self.follow_path()
+            self.KB.current_path = deque()
+            return random.choice(["left", "right"])
         current_dir = get_direction(self.degrees)
 
         if current_dir == needed_dir:
@@ -470,7 +587,15 @@ class Agent:
         room first to utilize resolution algorithm in max level
 
         The last preference is random choice among actions
+
+        If a lookahead planner is set, its choice replaces the priority list
+        whenever the KB has a model to sample worlds from
         """
+        if self.planner:
+            action = self.planner.choose_action()
+            if action:
+                return action
+
         actions = self.all_safe_next_actions()
 
         # Level I: robot has clear objective
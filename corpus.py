@@ -0,0 +1,207 @@
+import os
+import sys
+import mmap
+import struct
+import scenarios
+from array import array
+from bisect import bisect_left
+
+# Binary scenario corpus, all integers little-endian:
+#   header  magic "RSCN", version u16, reserved u16, count u64, index offset u64
+#   records grid x, y, monster x, y, luke x, y as u16, pit count u32,
+#           then pit x, y as u16 for every pit, sorted
+#   index   count u64 offsets of the records from the start of the file
+HEADER = struct.Struct("<4sHHQQ")
+RECORD = struct.Struct("<HHHHHHI")
+ROOM = struct.Struct("<HH")
+OFFSET = struct.Struct("<Q")
+MAGIC = b"RSCN"
+VERSION = 2
+MAX_COORDINATE = 0xFFFF  # rooms and grid sizes are stored as u16
+
+
+def check_scenario(scenario):
+    """Raise ValueError if a scenario cannot be stored in a record, e.g. a
+    ChunkedWorld scenario without a pit list, or coordinates beyond u16."""
+    for key in ("grid", "monster", "pits", "luke"):
+        try:
+            scenario[key]
+        except KeyError:
+            raise ValueError(f"it has no '{key}'") from None
+    for key in ("grid", "monster", "luke"):
+        check_room(key, scenario[key])
+    for pit in scenario['pits']:
+        check_room("pit", pit)
+
+
+def check_room(name, room):
+    try:
+        x, y = room
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} {room!r} is not an [x, y] room") from None
+    if not all(isinstance(c, int) and 0 <= c <= MAX_COORDINATE for c in (x, y)):
+        raise ValueError(f"{name} {room} is not two integers between 0 and {MAX_COORDINATE}")
+
+
+def write_corpus(path, scenarios):
+    """Write scenarios in the format of scenarios.py to a corpus file. The
+    scenarios are streamed, so any iterable (e.g. a generator) works. They
+    are written to a temporary file renamed to path once complete, so a
+    scenario that cannot be stored raises ValueError and leaves no file."""
+    offsets = array('Q')
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+            for i, scenario in enumerate(scenarios):
+                try:
+                    check_scenario(scenario)
+                except ValueError as e:
+                    raise ValueError(f"scenario {i} cannot be stored: {e}") from None
+                offsets.append(f.tell())
+                pits = scenario['pits']
+                f.write(RECORD.pack(*scenario['grid'], *scenario['monster'],
+                                    *scenario['luke'], len(pits)))
+                for pit in sorted(tuple(pit) for pit in pits):
+                    f.write(ROOM.pack(*pit))
+            index_offset = f.tell()
+            if sys.byteorder != "little":
+                offsets.byteswap()
+            offsets.tofile(f)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, 0, len(offsets), index_offset))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class PitView:
+    """Read-only sorted sequence of (x, y) pits stored in a memory-mapped
+    record. Membership is a binary search over the mapped pits and accepts
+    rooms as tuples or [x, y] lists like MonsterWorld uses."""
+    def __init__(self, buffer, offset, count):
+        self.buffer = buffer
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not -self.count <= i < self.count:
+            raise IndexError("pit index out of range")
+        return ROOM.unpack_from(self.buffer, self.offset + (i % self.count) * ROOM.size)
+
+    def __contains__(self, room):
+        room = tuple(room)
+        i = bisect_left(self, room)
+        return i < self.count and self[i] == room
+
+
+class ScenarioRecord:
+    """A scenario read in place from the corpus. It can be passed to
+    MonsterWorld and run_game wherever a scenarios.py dict is accepted.
+    Nothing is copied out of the mapped file up front: every field is
+    decoded when it is looked up, as an [x, y] list like scenarios.py uses,
+    and the pits stay in the file behind a PitView."""
+    def __init__(self, buffer, offset):
+        self.buffer = buffer
+        self.offset = offset
+
+    @property
+    def grid(self):
+        return list(ROOM.unpack_from(self.buffer, self.offset))
+
+    @property
+    def monster(self):
+        return list(ROOM.unpack_from(self.buffer, self.offset + ROOM.size))
+
+    @property
+    def luke(self):
+        return list(ROOM.unpack_from(self.buffer, self.offset + 2 * ROOM.size))
+
+    @property
+    def pits(self):
+        n_pits = RECORD.unpack_from(self.buffer, self.offset)[-1]
+        return PitView(self.buffer, self.offset + RECORD.size, n_pits)
+
+    def __getitem__(self, key):
+        if key not in ("grid", "monster", "pits", "luke"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+
+class ScenarioCorpus:
+    """Memory-mapped, read-only view of a corpus file. Every process that
+    opens the same file shares the page cache, and corpus[i] only reads the
+    i-th index entry and record. A file too short for its header and index
+    raises ValueError when opened, a record reaching past the records raises
+    ValueError when read."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.read_header()
+        except ValueError:
+            self.buffer.close()
+            raise
+
+    def read_header(self):
+        if len(self.buffer) < HEADER.size:
+            raise ValueError(f"{self.path} is not a scenario corpus")
+        magic, version, _, self.count, self.index_offset = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} scenario corpus")
+        if not HEADER.size <= self.index_offset <= len(self.buffer) - self.count * OFFSET.size:
+            raise ValueError(f"{self.path} is truncated, its index is out of bounds")
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not -self.count <= i < self.count:
+            raise IndexError("scenario index out of range")
+        offset, = OFFSET.unpack_from(self.buffer, self.index_offset + (i % self.count) * OFFSET.size)
+        if not HEADER.size <= offset <= self.index_offset - RECORD.size:
+            raise ValueError(f"record {i} of {self.path} is out of bounds")
+        n_pits = RECORD.unpack_from(self.buffer, offset)[-1]
+        if offset + RECORD.size + n_pits * ROOM.size > self.index_offset:
+            raise ValueError(f"record {i} of {self.path} is out of bounds")
+        return ScenarioRecord(self.buffer, offset)
+
+    def close(self):
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python3 corpus.py <corpus file> <scenario> [<scenario> ...]")
+        quit()
+
+    try:
+        selected = [getattr(scenarios, name) for name in sys.argv[2:]]
+    except AttributeError as e:
+        print(f"Scenario {e.name} not found.")
+        quit()
+
+    for name, scenario in zip(sys.argv[2:], selected):
+        try:
+            check_scenario(scenario)
+        except ValueError as e:
+            print(f"Scenario {name} cannot be stored: {e}")
+            quit()
+
+    write_corpus(sys.argv[1], selected)
+    print(f"Wrote {len(selected)} scenarios to {sys.argv[1]}")
+
+if __name__ == "__main__":
+    main()
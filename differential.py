@@ -0,0 +1,259 @@
+import io
+import sys
+import copy
+import time
+import random
+import contextlib
+from agent import Agent
+from monster_world import MonsterWorld
+
+REFERENCE = "enumeration"
+MAX_UNKNOWN_ROOMS = 10  # the reference enumerates 2^n * n worlds, keep n small
+MAX_CASES_PER_SCENARIO = 4  # so the scenario half of the cases spans many scenarios
+BUMP_PROBABILITY = 0.1  # chance that a random KB step feels a wall
+KB_FIELDS = ["visited_rooms", "all_rooms", "safe_rooms", "breeze", "stench",
+             "pits", "no_pit_rooms", "no_monster_rooms"]
+
+
+def random_scenario(rng):
+    """Return a random scenario in the same format as scenarios.py."""
+    grid = [rng.randint(3, 5), rng.randint(3, 5)]
+    rooms = [[x, y] for x in range(grid[0]) for y in range(grid[1]) if (x, y) != (0, 0)]
+    rng.shuffle(rooms)
+    n_pits = rng.randint(0, min(3, len(rooms) - 2))
+    return {
+        "grid": grid,
+        "monster": rooms[0],
+        "pits": rooms[1:n_pits + 1],
+        "luke": rooms[-1]
+    }
+
+
+def unknown_room_count(agent):
+    return len(agent.KB.all_rooms - agent.KB.visited_rooms - agent.KB.safe_rooms)
+
+
+def scenario_cases(scenario, rng, max_steps=60):
+    """Play a scenario with the reference engine and yield a (loc, KB)
+    snapshot right after percepts are recorded at each step."""
+    random.seed(rng.random())
+    world = MonsterWorld(scenario)
+    agent = world.agent
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(max_steps):
+            if not world.is_playing:
+                break
+            agent.record_percepts(world.get_percepts(), agent.loc)
+            if unknown_room_count(agent) <= MAX_UNKNOWN_ROOMS:
+                yield agent.loc, copy.deepcopy(agent.KB)
+            agent.inference_algorithm()
+            world.take_action(agent.choose_next_action())
+
+
+def wall_directions(agent, loc):
+    """Directions in which a wall next to loc would leave every visited room
+    inside the cave."""
+    visited = agent.KB.visited_rooms
+    directions = []
+    if all(room[0] <= loc[0] for room in visited):
+        directions.append("right")
+    if all(room[0] >= loc[0] for room in visited):
+        directions.append("left")
+    if all(room[1] <= loc[1] for room in visited):
+        directions.append("up")
+    if all(room[1] >= loc[1] for room in visited):
+        directions.append("down")
+    return directions
+
+
+def random_kb_case(rng, max_steps=12):
+    """Walk an agent through random rooms with random percepts that no world
+    has to back up, so the KB may even be inconsistent, and return the
+    (loc, KB) snapshot of the last step. Bumps are only felt against walls
+    that leave the visited rooms inside, so the topology prunes phantom
+    rooms but never the agent's own trail."""
+    agent = Agent(None)
+    loc = (0, 0)
+    for step in range(rng.randint(1, max_steps)):
+        agent.loc = loc
+        directions = wall_directions(agent, loc)
+        bump = directions and rng.random() < BUMP_PROBABILITY
+        if bump:
+            agent.degrees = ["up", "right", "down", "left"].index(rng.choice(directions)) * 90
+        percepts = [
+            "stench" if rng.random() < 0.3 else None,
+            "breeze" if rng.random() < 0.4 else None,
+            None,
+            "bump" if bump else None,
+            "scream" if rng.random() < 0.02 else None
+        ]
+        agent.record_percepts(percepts, loc)
+        if step and unknown_room_count(agent) > MAX_UNKNOWN_ROOMS:
+            break
+        snapshot = loc, copy.deepcopy(agent.KB)
+        agent.inference_algorithm()
+        loc = rng.choice(sorted(agent.adjacent_rooms(loc)))
+    return snapshot
+
+
+def run_engine(case, engine):
+    """Run the inference algorithm with one engine on a copy of the case and
+    return the inferred (pits, monster, safe_rooms) and the time the Level
+    III engine took, leaving out the Level I and II steps all engines share."""
+    loc, kb = case
+    agent = Agent(None)
+    agent.loc = loc
+    agent.KB = copy.deepcopy(kb)
+    agent.inference_engine = engine
+    elapsed = 0.0
+
+    def timed_engine(agent):
+        nonlocal elapsed
+        start = time.perf_counter()
+        try:
+            Agent.resolution_engines[engine](agent)
+        finally:
+            elapsed = time.perf_counter() - start
+
+    agent.resolution_engines = {engine: timed_engine}
+    try:
+        agent.inference_algorithm()
+    except Exception as e:
+        return f"raised {e!r}", elapsed
+    return (agent.KB.pits, agent.KB.monster, agent.KB.safe_rooms), elapsed
+
+
+def is_mismatch(case, engine):
+    return run_engine(case, engine)[0] != run_engine(case, REFERENCE)[0]
+
+
+def minimize(case, engine):
+    """Greedily drop KB facts one at a time while the engine still disagrees
+    with the reference, until no single fact can be removed."""
+    loc, kb = copy.deepcopy(case)
+    shrunk = True
+    while shrunk:
+        shrunk = False
+        for field in KB_FIELDS:
+            for room in sorted(getattr(kb, field)):
+                getattr(kb, field).discard(room)
+                if is_mismatch((loc, kb), engine):
+                    shrunk = True
+                else:
+                    getattr(kb, field).add(room)
+        if kb.monster is not None:
+            monster, kb.monster = kb.monster, None
+            if is_mismatch((loc, kb), engine):
+                shrunk = True
+            else:
+                kb.monster = monster
+    return loc, kb
+
+
+def case_key(case):
+    """Everything about a case the inference algorithm reads, used to drop
+    duplicate snapshots."""
+    loc, kb = case
+    return (loc, tuple(frozenset(getattr(kb, field)) for field in KB_FIELDS),
+            frozenset(kb.bump.items()), kb.monster, kb.scream, kb.gasp,
+            tuple(kb.topology.wall_min), tuple(kb.topology.wall_max))
+
+
+def format_case(case):
+    loc, kb = case
+    lines = [f"loc = {loc}"]
+    for field in KB_FIELDS:
+        rooms = getattr(kb, field)
+        if rooms:
+            lines.append(f"KB.{field} = {sorted(rooms)}")
+    if kb.bump:
+        lines.append(f"KB.bump = {dict(sorted(kb.bump.items()))}")
+    for field in ["monster", "scream", "gasp"]:
+        if getattr(kb, field):
+            lines.append(f"KB.{field} = {getattr(kb, field)}")
+    lines.append(f"KB.topology.wall_min = {kb.topology.wall_min}")
+    lines.append(f"KB.topology.wall_max = {kb.topology.wall_max}")
+    return "\n".join(lines)
+
+
+def generate_cases(n_cases, rng):
+    """Half of the cases come from random scenarios, half from random KBs.
+    Every case is distinct, and a scenario contributes at most
+    MAX_CASES_PER_SCENARIO of its snapshots, so an agent looping in one
+    cave cannot fill the scenario half with near-identical cases."""
+    seen = set()
+
+    def is_new(case):
+        key = case_key(case)
+        if key in seen:
+            return False
+        seen.add(key)
+        return True
+
+    cases = []
+    while len(cases) < n_cases // 2:
+        snapshots = [case for case in scenario_cases(random_scenario(rng), rng) if is_new(case)]
+        cases.extend(rng.sample(snapshots, min(len(snapshots), MAX_CASES_PER_SCENARIO)))
+    cases = cases[:n_cases // 2]
+    while len(cases) < n_cases:
+        case = random_kb_case(rng)
+        if is_new(case):
+            cases.append(case)
+    return cases
+
+
+def run_harness(n_cases, seed, engines=None):
+    """Run every engine against the reference on the same cases. Return the
+    list of (engine, case, reference result, engine result) for every
+    mismatch and the total time spent by each engine."""
+    engines = engines or list(Agent.resolution_engines)
+    rng = random.Random(seed)
+    cases = generate_cases(n_cases, rng)
+    mismatches = []
+    timings = {engine: 0.0 for engine in engines}
+    for case in cases:
+        expected, elapsed = run_engine(case, REFERENCE)
+        timings[REFERENCE] = timings.get(REFERENCE, 0.0) + elapsed
+        for engine in engines:
+            if engine == REFERENCE:
+                continue
+            result, elapsed = run_engine(case, engine)
+            timings[engine] += elapsed
+            if result != expected:
+                mismatches.append((engine, case, expected, result))
+    return mismatches, timings
+
+
+def main():
+    if len(sys.argv) > 3:
+        print("Usage: python3 differential.py [cases] [seed]")
+        quit()
+    n_cases = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    mismatches, timings = run_harness(n_cases, seed)
+
+    reported = set()
+    for engine, case, _, _ in mismatches:
+        if engine in reported:
+            continue
+        reported.add(engine)
+        case = minimize(case, engine)
+        print(f"MISMATCH {engine} vs {REFERENCE}, minimized reproducer:")
+        print(format_case(case))
+        print(f"  {REFERENCE}: pits, monster, safe_rooms = {run_engine(case, REFERENCE)[0]}")
+        print(f"  {engine}: pits, monster, safe_rooms = {run_engine(case, engine)[0]}")
+        print()
+
+    print(f"{'engine':<14}{'cases':>7}{'mismatches':>12}{'total ms':>11}{'speedup':>9}")
+    for engine, elapsed in timings.items():
+        count = sum(1 for m in mismatches if m[0] == engine)
+        speedup = timings[REFERENCE] / elapsed if elapsed else float('inf')
+        print(f"{engine:<14}{n_cases:>7}{count:>12}{elapsed * 1000:>11.1f}{speedup:>8.1f}x")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
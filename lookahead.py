@@ -0,0 +1,235 @@
+import time
+import random
+from bisect import bisect_right
+from itertools import accumulate
+from collections import deque
+from utils import get_direction, is_facing
+
+# Actions in order of preference when their expected values tie
+ACTIONS = ["climb", "grab", "forward", "left", "right", "shoot"]
+STEP_COST = 1
+DEATH_PENALTY = 1000
+RESCUE_REWARD = 1000
+LUKE_VALUE = 500  # leaf value of carrying Luke, so grabbing pays off before climbing is in reach
+EXPLORE_BONUS = 20  # leaf value of every room entered for the first time
+KILL_BONUS = 50  # leaf value of killing the monster, the scream lets the KB clear its stench
+BLASTER_VALUE = 30  # leaf value of a blaster still loaded while the monster lives
+
+
+def distances_from(sources, rooms):
+    """Multi-source BFS over 'rooms', return {room: steps to nearest source}."""
+    dist = {room: 0 for room in sources if room in rooms}
+    queue = deque(dist)
+    while queue:
+        x, y = queue.popleft()
+        for nxt in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
+            if nxt in rooms and nxt not in dist:
+                dist[nxt] = dist[(x, y)] + 1
+                queue.append(nxt)
+    return dist
+
+
+class LookaheadPlanner:
+    """Depth-limited expectimax over worlds sampled from the model of the KB.
+
+    Each sampled world is a (pits, monster) pair drawn from the sets of
+    consistent rooms the closed-form engine uses, so sampling never
+    enumerates worlds. The agent is simulated on a lightweight state tuple
+    (loc, degrees, has_luke, monster_alive, blaster, new_rooms) instead of a
+    copy of MonsterWorld. A node holds the group of worlds still consistent
+    with what the simulated agent has observed, and picks one action for all
+    of them; the worlds are split again whenever the outcome differs (death,
+    scream, or the breeze and stench felt in a newly entered room).
+
+    Samples are drawn with the KB generation as seed, so they, and the
+    memoized (state, depth, group) values, are reused until the KB learns
+    something new. The search stops expanding once the node or time budget
+    of a decision is spent and falls back to the leaf heuristic."""
+    def __init__(self, agent, depth=4, samples=8, node_budget=5000, time_budget=0.2):
+        self.agent = agent
+        self.depth = depth
+        self.samples = samples
+        self.node_budget = node_budget
+        self.time_budget = time_budget
+        self.generation = None
+        self.worlds = []
+        self.memo = {}
+
+
+    def choose_action(self):
+        """Return the action with the best expected value, or None if the KB
+        has no model to sample from."""
+        agent = self.agent
+        self.nodes = 0
+        self.deadline = time.perf_counter() + self.time_budget
+        if agent.KB.generation != self.generation:
+            self.prepare()
+        if not self.worlds:
+            return None
+
+        root = (agent.loc, agent.degrees % 360, agent.has_luke, not agent.KB.scream,
+                agent.blaster, frozenset())
+        group = tuple(range(len(self.worlds)))
+        actions = self.legal_actions(root)
+        values = {action: self.q_value(root, action, self.depth, group) for action in actions}
+        return max(actions, key=lambda action: values[action])
+
+
+    def prepare(self):
+        """Sample worlds and precompute leaf distances for the current KB."""
+        agent = self.agent
+        KB = agent.KB
+        self.generation = KB.generation
+        self.memo = {}
+        self.worlds = []
+        for pits, monster in self.sample_models(random.Random(KB.generation)):
+            if KB.monster and not KB.scream:
+                monster = KB.monster  # the located monster is marked safe to path toward it
+            self.worlds.append((pits | KB.pits, monster))
+
+        # leaf targets: Luke if known, else the nearest unvisited safe room,
+        # else a room from which the located monster can be shot
+        if KB.luke:
+            targets = [KB.luke]
+        elif KB.unvisited_rooms:
+            targets = KB.unvisited_rooms
+        elif KB.monster and not KB.scream and agent.blaster:
+            targets = [room for room in KB.safe_rooms if room[0] == KB.monster[0] or room[1] == KB.monster[1]]
+        else:
+            targets = []
+        self.far = len(KB.safe_rooms) + 1
+        self.home_dist = distances_from([(0, 0)], KB.safe_rooms)
+        self.target_dist = distances_from(targets, KB.safe_rooms)
+
+
+    def sample_models(self, rng):
+        """Draw distinct worlds uniformly from the model of the KB, all of
+        them if it has no more than self.samples, without enumerating it.
+        Each monster room is drawn in proportion to the number of worlds it
+        is in: every subset of the other pit rooms, but the empty one once a
+        breeze is known."""
+        pit_rooms, monster_rooms, breeze = self.agent.consistent_rooms()
+        # a breeze needs a pit, so drop the monsters that leave no room for one
+        monsters = sorted(m for m in monster_rooms if not breeze or pit_rooms - {m})
+        counts = [2 ** len(pit_rooms - {monster}) - breeze for monster in monsters]
+        cumulative = list(accumulate(counts))
+        model_size = cumulative[-1] if cumulative else 0
+        worlds = {}
+        while len(worlds) < min(self.samples, model_size):
+            # integer draw, the counts may be too large for float weights
+            monster = monsters[bisect_right(cumulative, rng.randrange(model_size))]
+            rooms = sorted(pit_rooms - {monster})
+            pits = set()
+            while not pits:
+                pits = {room for room in rooms if rng.random() < 0.5}
+                if not breeze:
+                    break
+            worlds.setdefault((frozenset(pits), monster), (pits, monster))
+        return list(worlds.values())
+
+
+    def out_of_budget(self):
+        return self.nodes >= self.node_budget or time.perf_counter() >= self.deadline
+
+
+    def legal_actions(self, state):
+        loc, degrees, has_luke, _, blaster, _ = state
+        actions = []
+        for action in ACTIONS:
+            match action:
+                case "climb":
+                    if has_luke and loc == (0, 0):
+                        actions.append(action)
+                case "grab":
+                    if not has_luke and loc == self.agent.KB.luke:
+                        actions.append(action)
+                case "forward":
+                    dx, dy = self.agent.orientation_to_delta[get_direction(degrees)]
+                    if self.agent.KB.topology.in_bounds((loc[0] + dx, loc[1] + dy)):
+                        actions.append(action)
+                case "shoot":
+                    if blaster:
+                        actions.append(action)
+                case _:
+                    actions.append(action)
+        return actions
+
+
+    def simulate(self, state, action, world):
+        """Return (next state, reward, done, observation) of taking an action
+        in a world. The observation is the (breeze, stench) felt on entering
+        a new room, and None otherwise."""
+        loc, degrees, has_luke, monster_alive, blaster, new_rooms = state
+        pits, monster = world
+        direction = get_direction(degrees)
+        observation = None
+        match action:
+            case "forward":
+                dx, dy = self.agent.orientation_to_delta[direction]
+                nxt = (loc[0] + dx, loc[1] + dy)
+                if nxt in pits or (monster_alive and nxt == monster):
+                    return None, -STEP_COST - DEATH_PENALTY, True, None
+                if nxt not in self.agent.KB.visited_rooms and nxt not in new_rooms:
+                    new_rooms = new_rooms | {nxt}
+                    adjacent = self.agent.adjacent_rooms(nxt)
+                    observation = (bool(adjacent & pits),
+                                   monster_alive and bool(monster) and monster in adjacent)
+                loc = nxt
+            case "left":
+                degrees = (degrees - 90) % 360
+            case "right":
+                degrees = (degrees + 90) % 360
+            case "shoot":
+                blaster = False
+                if monster_alive and monster and is_facing(loc, direction, monster):
+                    monster_alive = False
+            case "grab":
+                has_luke = True
+            case "climb":
+                return None, RESCUE_REWARD - STEP_COST, True, None
+        return (loc, degrees, has_luke, monster_alive, blaster, new_rooms), -STEP_COST, False, observation
+
+
+    def q_value(self, state, action, depth, group):
+        """Expected value of an action over a group of worlds, splitting the
+        group by outcome."""
+        outcomes = {}
+        for i in group:
+            outcome = self.simulate(state, action, self.worlds[i])
+            outcomes.setdefault(outcome, []).append(i)
+        total = 0
+        for (nxt, reward, done, _), worlds in outcomes.items():
+            if not done:
+                reward += self.value(nxt, depth - 1, tuple(worlds))
+            total += reward * len(worlds)
+        return total / len(group)
+
+
+    def value(self, state, depth, group):
+        if depth == 0:
+            return self.evaluate(state)
+        key = (state, depth, group)
+        if key not in self.memo:
+            if self.out_of_budget():
+                return self.evaluate(state)
+            self.nodes += 1
+            self.memo[key] = max(self.q_value(state, action, depth, group)
+                                 for action in self.legal_actions(state))
+        return self.memo[key]
+
+
+    def evaluate(self, state):
+        """Heuristic value of a leaf: progress toward home when carrying Luke,
+        otherwise rooms explored and a kill, plus closeness to the current
+        target, measured along known safe rooms."""
+        loc, _, has_luke, monster_alive, blaster, new_rooms = state
+        if has_luke:
+            return LUKE_VALUE - self.home_dist.get(loc, self.far)
+        value = EXPLORE_BONUS * len(new_rooms)
+        if not monster_alive and not self.agent.KB.scream:
+            value += KILL_BONUS
+        elif monster_alive and blaster:
+            value += BLASTER_VALUE
+        if self.target_dist:
+            value -= self.target_dist.get(loc, self.far)
+        return value
@@ -1,8 +1,18 @@
 import sys
+import random
+from collections import OrderedDict
 from scenarios import *
 from agent import Agent
+from corpus import ScenarioCorpus
+from lookahead import LookaheadPlanner, distances_from
 from visualize_world import visualize_world
-from utils import get_direction, is_facing_monster
+from utils import get_direction, is_facing
+
+MAX_STEPS = 1000  # step budget of a single episode
+LIVELOCK_WINDOW = 16  # repeated states without new knowledge, per reachable state
+CHUNK_SIZE = 16  # side of a lazily generated chunk of a ChunkedWorld
+MAX_CHUNKS = 64  # chunks a ChunkedWorld keeps cached at most
+KEEP_RADIUS = 2  # chunks further than this from R2's chunk are evicted
 
 def fit_grid(grid, item):
     """Used for calculating breeze and stench locationsbased on pit and monster
@@ -22,6 +32,47 @@ def fit_grid(grid, item):
 
     return loc
 
+# LIVELOCK DETECTION
+class LivelockDetector:
+    """Track the (location, heading, has_luke) states the agent passes
+    through since its KB last learned something.
+
+    While the agent still has a Level I objective (Luke to grab or carry home,
+    a located monster to shoot) or a reachable unvisited safe room, it is
+    never stuck. Otherwise it is left to wander at random, and is stuck once
+    it has only revisited states for 'window' steps per state it can reach,
+    so a random walk gets the time to cover every heading of every safe room."""
+    def __init__(self, window):
+        self.window = window
+        self.generation = None
+        self.seen = set()
+        self.repeats = 0
+
+    def has_objective(self, agent, reachable):
+        KB = agent.KB
+        if agent.has_luke or KB.luke:
+            return True
+        if KB.monster and not KB.scream and agent.blaster:
+            return True
+        return any(room in reachable for room in KB.unvisited_rooms)
+
+    def is_stuck(self, agent):
+        if agent.KB.generation != self.generation:
+            self.generation = agent.KB.generation
+            self.seen = set()
+        state = (agent.loc, get_direction(agent.degrees), agent.has_luke)
+        if state in self.seen:
+            self.repeats += 1
+        else:
+            self.seen.add(state)
+            self.repeats = 0
+        if self.repeats < self.window:
+            return False
+        reachable = distances_from([agent.loc], agent.KB.safe_rooms | {agent.loc})
+        if self.has_objective(agent, reachable):
+            return False
+        return self.repeats >= self.window * 4 * len(reachable)
+
 # ENVIRONMENT
 class MonsterWorld:
     def __init__(self, worldInit):
@@ -31,13 +82,9 @@ class MonsterWorld:
         self.monster = worldInit['monster']
         self.pits = worldInit['pits']
         self.luke = worldInit['luke']
-        self.monsterAlive = True
-        self.is_playing = True
 
-        # calculate breeze and stench locations
-        breeze = []
-        for pit in self.pits:
-            breeze += fit_grid(self.gridsize, pit)
+        # calculate stench locations, breeze is felt next to any pit, which
+        # only needs membership in self.pits (a list or a corpus PitView)
         stench = fit_grid(self.gridsize, self.monster)
 
         # prepopulate grid with percepts
@@ -45,7 +92,7 @@ class MonsterWorld:
             [
                 [
                     "stench" if [x, y] in stench else None,
-                    "breeze" if [x, y] in breeze else None,
+                    "breeze" if any(room in self.pits for room in fit_grid(self.gridsize, [x, y])) else None,
                     None,  # "gasp" index
                     None,  # "bump" index
                     None   # "scream" index
@@ -57,12 +104,29 @@ class MonsterWorld:
 
         # set "gasp" percept at Luke's location
         self.grid[self.luke[0]][self.luke[1]][2] = "gasp"
+        self.start_game()
+
+    def start_game(self):
+        """Set up the state every world starts a game with, once the cave
+        is in place: the monster alive and R2 at the entrance."""
+        self.monsterAlive = True
+        self.is_playing = True
+        self.outcome = None  # "rescued", "died" or "stalled" once the game ends
         self.agent = Agent(self)
 
     def get_percepts(self):
         x, y = self.agent.loc
         return self.grid[x][y]
 
+    def in_bounds(self, x, y):
+        return 0 <= x < self.X and 0 <= y < self.Y
+
+    def broadcast_scream(self):
+        for x in range(self.gridsize[0]):
+            for y in range(self.gridsize[1]):
+                self.grid[x][y][4] = "scream"  # scream everywhere
+                self.grid[x][y][0] = None  # stench is gone
+
     def take_action(self, action):
         x, y = self.agent.loc
         self.agent.score -= 1
@@ -81,7 +145,7 @@ class MonsterWorld:
             dx, dy = movements.get(orientation, (0, 0))
             new_x, new_y = x + dx, y + dy
 
-            if 0 <= new_x < len(self.grid) and 0 <= new_y < len(self.grid[0]):
+            if self.in_bounds(new_x, new_y):
                 self.agent.loc = (new_x, new_y)
             else:
                 moved = False
@@ -92,6 +156,7 @@ class MonsterWorld:
                 print("R2-D2 has been crushed, -1000 points")
                 print("Your final score is: ", self.agent.score)
                 self.is_playing = False
+                self.outcome = "died"
             
             percepts = self.get_percepts()
             percepts[3] = "bump" if not moved else None  # reset bump = None if no bump
@@ -112,13 +177,10 @@ class MonsterWorld:
         elif action == "shoot":
             if self.agent.blaster:
                 self.agent.blaster = False
-                if is_facing_monster(self.agent):
+                if self.monster and is_facing(self.agent.loc, get_direction(self.agent.degrees), self.monster):
                     self.monsterAlive = False
                     self.monster = None
-                    for x in range(self.gridsize[0]):
-                        for y in range(self.gridsize[1]):
-                            self.grid[x][y][4] = "scream"  # scream everywhere
-                            self.grid[x][y][0] = None  # stench is gone
+                    self.broadcast_scream()
                 print("Blaster bolt was shot")
             print("No more blaster bolts available")
 
@@ -140,6 +202,7 @@ class MonsterWorld:
                 print("Congrats! R2 has saved Luke! +1000 points!")
                 print("Your final score is: ", self.agent.score)
                 self.is_playing = False
+                self.outcome = "rescued"
             else:
                 print("Climb requirements are not met yet")
 
@@ -151,24 +214,189 @@ class MonsterWorld:
         x, y = self.agent.loc
         return [x, y]
 
+# CHUNKED ENVIRONMENT
+class PitSet:
+    """Membership view over the pits of a ChunkedWorld, accepting rooms as
+    tuples or [x, y] lists like MonsterWorld.pits."""
+    def __init__(self, world):
+        self.world = world
+
+    def __contains__(self, room):
+        return self.world.has_pit(tuple(room))
+
+
+class ChunkedWorld(MonsterWorld):
+    """A cave of nominal size 'grid' that is never allocated. Pits are drawn
+    per CHUNK_SIZE x CHUNK_SIZE chunk from the scenario seed the first time
+    the chunk is needed, and percepts are computed from the pits around R2,
+    so memory depends on the area explored rather than on the cave size.
+    Chunks live in an LRU cache of MAX_CHUNKS and are evicted once R2 moves
+    more than KEEP_RADIUS chunks away; an evicted chunk is regenerated
+    identically from the seed if R2 comes back.
+
+    The scenario holds 'grid' and 'seed', optionally 'pit_density' (0.1 by
+    default), 'monster' and 'luke' (drawn from the seed when missing, never
+    in the same room), and 'chunk_size', 'max_chunks' and 'keep_radius'.
+
+    Unlike the pits, the monster is not generated per chunk: the KB and the
+    scream assume a single monster, so it is one room of the whole cave. A
+    drawn monster is then almost never met in a huge cave, so give one to
+    meet it. R2 infers with the closed_form engine here, the enumeration
+    reference is exponential in the frontier, which grows with the explored
+    area."""
+    def __init__(self, worldInit):
+        self.gridsize = worldInit['grid']
+        self.X = self.gridsize[0]
+        self.Y = self.gridsize[1]
+        self.seed = worldInit['seed']
+        self.pit_density = worldInit.get('pit_density', 0.1)
+        self.chunk_size = worldInit.get('chunk_size', CHUNK_SIZE)
+        self.max_chunks = worldInit.get('max_chunks', MAX_CHUNKS)
+        self.keep_radius = worldInit.get('keep_radius', KEEP_RADIUS)
+        self.monster = worldInit.get('monster')
+        self.luke = worldInit.get('luke')
+        if not self.monster:
+            self.monster = self.random_room("monster", [self.luke] if self.luke else [])
+        if not self.luke:
+            self.luke = self.random_room("luke", [self.monster])
+        self.reserved = {(0, 0), tuple(self.monster), tuple(self.luke)}  # never pits
+        self.pits = PitSet(self)
+        self.chunks = OrderedDict()  # {(cx, cy): frozenset of pit rooms}
+        self.chunk = None  # chunk R2 was in when far chunks were last evicted
+        self.percepts = None  # (loc, percepts) so bumps stick like grid cells
+        self.scream = False
+        self.start_game()
+        self.agent.inference_engine = "closed_form"
+
+    def random_room(self, name, taken):
+        """Draw a room for 'name' from the seed, other than the start and the
+        rooms already taken."""
+        taken = {(0, 0)} | {tuple(room) for room in taken}
+        if self.X * self.Y <= len(taken):
+            raise ValueError(f"a {self.X}x{self.Y} cave has no free room left to place {name}")
+        rng = random.Random(f"{self.seed}:{name}")
+        room = (0, 0)
+        while room in taken:
+            room = (rng.randrange(self.X), rng.randrange(self.Y))
+        return list(room)
+
+    def get_chunk(self, cx, cy):
+        """Return the pits of a chunk, generating it if it is not cached."""
+        key = (cx, cy)
+        if key in self.chunks:
+            self.chunks.move_to_end(key)
+            return self.chunks[key]
+
+        rng = random.Random(f"{self.seed}:{cx}:{cy}")
+        pits = set()
+        for x in range(cx * self.chunk_size, (cx + 1) * self.chunk_size):
+            for y in range(cy * self.chunk_size, (cy + 1) * self.chunk_size):
+                # draw for every room so the layout never depends on the bounds
+                if rng.random() < self.pit_density and self.in_bounds(x, y) \
+                        and (x, y) not in self.reserved:
+                    pits.add((x, y))
+        self.chunks[key] = frozenset(pits)
+        if len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return self.chunks[key]
+
+    def evict_far_chunks(self):
+        x, y = self.agent.loc
+        cx, cy = x // self.chunk_size, y // self.chunk_size
+        if (cx, cy) == self.chunk:
+            return
+        self.chunk = (cx, cy)
+        for key in list(self.chunks):
+            if max(abs(key[0] - cx), abs(key[1] - cy)) > self.keep_radius:
+                del self.chunks[key]
+
+    def has_pit(self, room):
+        x, y = room
+        if not self.in_bounds(x, y):
+            return False
+        return room in self.get_chunk(x // self.chunk_size, y // self.chunk_size)
+
+    def get_percepts(self):
+        loc = self.agent.loc
+        if self.percepts and self.percepts[0] == loc:
+            return self.percepts[1]
+        self.evict_far_chunks()
+        x, y = loc
+        adjacent = [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
+        percepts = [
+            "stench" if self.monsterAlive and tuple(self.monster) in adjacent else None,
+            "breeze" if any(self.has_pit(room) for room in adjacent) else None,
+            "gasp" if self.luke and list(loc) == list(self.luke) else None,
+            None,  # "bump" index, set by take_action
+            "scream" if self.scream else None
+        ]
+        self.percepts = (loc, percepts)
+        return percepts
+
+    def broadcast_scream(self):
+        self.scream = True
+        self.percepts = None  # recompute stench and scream
+
 # RUN THE GAME
-def run_game(scenario):
-    w = MonsterWorld(scenario)
-    is_playing = True
+def run_game(scenario, max_steps=MAX_STEPS, livelock_window=LIVELOCK_WINDOW, lookahead=None):
+    """Play a scenario until R2 climbs out or dies, or until the episode is
+    stalled: the step budget runs out or R2 keeps cycling through states
+    without learning anything new. Return the final score, whether R2 has
+    Luke, R2's location and the outcome.
+
+    Scenarios with a 'seed' are played on a lazily generated ChunkedWorld.
+    Pass a dict of LookaheadPlanner options as lookahead (e.g. {} for the
+    defaults) to choose actions by expectimax instead of the priority list."""
+    if isinstance(scenario, dict) and 'seed' in scenario:
+        w = ChunkedWorld(scenario)
+    else:
+        w = MonsterWorld(scenario)
+    if lookahead is not None:
+        w.agent.planner = LookaheadPlanner(w.agent, **lookahead)
+    detector = LivelockDetector(livelock_window)
+    steps = 0
     while w.is_playing:
         visualize_world(w, w.agent.loc, get_direction(w.agent.degrees))
         percepts = w.get_percepts()
         w.agent.record_percepts(percepts, w.agent.loc)
 
         w.agent.inference_algorithm()
+        if steps >= max_steps or detector.is_stuck(w.agent):
+            print("R2-D2 is stuck and the episode has stalled")
+            print("Your final score is: ", w.agent.score)
+            w.is_playing = False
+            w.outcome = "stalled"
+            break
         action = w.agent.choose_next_action()
         w.take_action(action)
-    return w.agent.score, w.agent.has_luke, w.agent.loc
+        steps += 1
+    return w.agent.score, w.agent.has_luke, w.agent.loc, w.outcome
 
 
 def main():
+    if len(sys.argv) == 3:
+        # play a scenario stored in a corpus written by corpus.py
+        try:
+            corpus = ScenarioCorpus(sys.argv[1])
+        except (OSError, ValueError) as e:
+            print(f"Corpus {sys.argv[1]} could not be read: {e}")
+            quit()
+
+        with corpus:
+            try:
+                scenario = corpus[int(sys.argv[2])]
+            except IndexError:
+                print(f"Scenario {sys.argv[2]} not found in {sys.argv[1]}.")
+                quit()
+            except ValueError as e:
+                print(f"Scenario {sys.argv[2]} could not be read from {sys.argv[1]}: {e}")
+                quit()
+            run_game(scenario)
+        return
+
     if len(sys.argv) != 2:
         print("Usage: python3 monster_world.py <scenario>")
+        print("       python3 monster_world.py <corpus file> <index>")
         quit()
     
     scenario_name = sys.argv[1]
@@ -39,3 +39,11 @@ S6 = {
     "pits": [[2,0],[2,2],[3,3],[1,1]],
     "luke": [1,2]
 }
+
+C1 = {
+    "grid": [1000000, 1000000],
+    "seed": 1,
+    "pit_density": 0.05,
+    "monster": [6, 8],
+    "luke": [20, 3]
+}
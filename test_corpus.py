@@ -0,0 +1,39 @@
+import os
+import pytest
+import scenarios
+from corpus import ScenarioCorpus, write_corpus
+from monster_world import MonsterWorld
+
+STORED = [scenarios.S1, scenarios.S2, scenarios.S3, scenarios.S4, scenarios.S5, scenarios.S6]
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "scenarios.bin"
+    write_corpus(path, iter(STORED))
+    with ScenarioCorpus(path) as corpus:
+        assert len(corpus) == len(STORED)
+        for scenario, record in zip(STORED, corpus):
+            for key in ("grid", "monster", "luke"):
+                assert record[key] == scenario[key]
+            assert sorted(map(list, record['pits'])) == sorted(scenario['pits'])
+            grid_x, grid_y = scenario['grid']
+            for room in ([x, y] for x in range(grid_x) for y in range(grid_y)):
+                assert (room in record['pits']) == (room in scenario['pits'])
+            assert MonsterWorld(record).grid == MonsterWorld(scenario).grid
+
+
+def test_truncated_corpus(tmp_path):
+    path = tmp_path / "scenarios.bin"
+    write_corpus(path, STORED)
+    with open(path, "r+b") as f:
+        f.truncate(40)
+    with pytest.raises(ValueError):
+        ScenarioCorpus(path)
+
+
+def test_unstorable_scenario_leaves_no_file(tmp_path):
+    path = tmp_path / "scenarios.bin"
+    for scenario in (scenarios.C1, dict(scenarios.S1, luke=[70000, 0])):
+        with pytest.raises(ValueError):
+            write_corpus(path, [scenarios.S1, scenario])
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,40 @@
+import io
+import random
+import contextlib
+import scenarios
+from monster_world import run_game, MAX_STEPS
+
+# Both rooms next to the start are pits, so R2 can never reach Luke
+BOXED_IN = {
+    "grid": [4, 4],
+    "monster": [3, 0],
+    "pits": [[1, 0], [0, 1]],
+    "luke": [3, 3]
+}
+
+
+def play(scenario, seed, **kwargs):
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return run_game(scenario, **kwargs)
+
+
+def test_random_walk_is_not_a_livelock():
+    # R2 wanders three safe rooms for dozens of steps before it lines up a shot
+    for seed in (7, 9):
+        score, has_luke, loc, outcome = play(scenarios.S6, seed)
+        assert outcome == "rescued", (seed, score, outcome)
+
+
+def test_livelock_stalls_early():
+    for seed in range(5):
+        score, has_luke, loc, outcome = play(BOXED_IN, seed)
+        assert outcome == "stalled", (seed, score, outcome)
+        assert -score < MAX_STEPS // 10, (seed, score)  # every action costs 1
+
+
+def test_step_budget_caps_episode():
+    for seed in range(5):
+        score, has_luke, loc, outcome = play(scenarios.S6, seed, max_steps=10)
+        assert outcome == "stalled", (seed, score, outcome)
+        assert -score == 10, (seed, score)
@@ -0,0 +1,55 @@
+import random
+from collections import Counter
+from agent import Agent
+from differential import generate_cases
+from lookahead import LookaheadPlanner
+
+
+def planner_for(case, samples):
+    loc, kb = case
+    agent = Agent(None)
+    agent.loc = loc
+    agent.KB = kb
+    return LookaheadPlanner(agent, samples=samples)
+
+
+def model_of(planner):
+    agent = planner.agent
+    return {(frozenset(pits), monster)
+            for pits, monster in agent.find_model_of_KB(agent.enumerate_possible_worlds())}
+
+
+def sampled(planner, seed):
+    return [(frozenset(pits), monster) for pits, monster in planner.sample_models(random.Random(seed))]
+
+
+def test_samples_are_distinct_models():
+    for i, case in enumerate(generate_cases(100, random.Random(0))):
+        planner = planner_for(case, samples=8)
+        model = model_of(planner)
+        worlds = sampled(planner, i)
+        assert len(set(worlds)) == len(worlds)
+        assert set(worlds) <= model
+        assert len(worlds) == min(8, len(model))
+
+
+def has_unequal_monster_counts(planner):
+    # with a breeze, a monster that could also be a pit is in fewer than
+    # half as many worlds as one that could not
+    pit_rooms, monster_rooms, breeze = planner.agent.consistent_rooms()
+    counts = {2 ** len(pit_rooms - {monster}) - breeze for monster in monster_rooms}
+    return breeze and len(counts - {0}) > 1
+
+
+def test_samples_are_uniform():
+    cases = [case for case in generate_cases(200, random.Random(0))
+             if has_unequal_monster_counts(planner_for(case, samples=1))
+             and len(model_of(planner_for(case, samples=1))) <= 12]
+    assert cases
+    for case in cases[:3]:
+        planner = planner_for(case, samples=1)
+        model = model_of(planner)
+        draws = 300 * len(model)
+        counts = Counter(world for seed in range(draws) for world in sampled(planner, seed))
+        for world in model:
+            assert abs(counts[world] - 300) < 75, (world, counts[world])
@@ -17,14 +17,17 @@ def get_direction(degrees):
             orientation = "left"
     return orientation
 
-def is_facing_monster(agent):
-    """You may wish to use this in all_safe_next_actions"""
-    if agent.KB.monster == set():
-        return False
-    x, y = agent.loc
-    wx, wy = agent.KB.monster
-    direction = get_direction(agent.degrees)
+def is_facing(loc, direction, target):
+    """True if target lies in a straight line ahead of loc."""
+    x, y = loc
+    wx, wy = target
     return (direction == "up" and wx == x and wy > y) or \
             (direction == "down" and wx == x and wy < y) or \
             (direction == "left" and wx < x and wy == y) or \
-            (direction == "right" and wx > x and wy == y)
\ No newline at end of file
+            (direction == "right" and wx > x and wy == y)
+
+def is_facing_monster(agent):
+    """You may wish to use this in all_safe_next_actions"""
+    if not agent.KB.monster:
+        return False
+    return is_facing(agent.loc, get_direction(agent.degrees), agent.KB.monster)
\ No newline at end of file
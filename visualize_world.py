@@ -1,4 +1,5 @@
 SPACING = 2
+VIEW = 16  # at most VIEW x VIEW rooms around R2D2 are drawn
 
 def visualize_world(world, r2d2_location, r2d2_direction):
     grid_size = world.gridsize
@@ -9,29 +10,37 @@ def visualize_world(world, r2d2_location, r2d2_direction):
     
     dir_symbols = {'left': '<', 'right': '>', 'up': '^', 'down': 'v'}
     
+    # Window of rooms around R2D2, the whole grid when it is small enough
+    x0 = min(max(r2d2_location[0] - VIEW // 2, 0), max(grid_size[0] - VIEW, 0))
+    y0 = min(max(r2d2_location[1] - VIEW // 2, 0), max(grid_size[1] - VIEW, 0))
+    xs = range(x0, min(x0 + VIEW, grid_size[0]))
+    ys = range(y0, min(y0 + VIEW, grid_size[1]))
+
     # Create an empty grid
-    grid = [['.' for _ in range(grid_size[0])] for _ in range(grid_size[1])]
+    grid = [['.' for _ in xs] for _ in ys]
 
     # Place safe rooms. Use this to visualize whether your inference algorithm
     # is correctly inferring room safety.
     # for room in safe_rooms:
-    #     if 0 <= room[1] < grid_size[1] and 0 <= room[0] < grid_size[0]:
-    #         grid[room[1]][room[0]] = 's'
+    #     if room[0] in xs and room[1] in ys:
+    #         grid[room[1] - y0][room[0] - x0] = 's'
     
     # Place Monster
-    if monster:
-        grid[monster[1]][monster[0]] = 'W'
+    if monster and monster[0] in xs and monster[1] in ys:
+        grid[monster[1] - y0][monster[0] - x0] = 'W'
     
     # Place pits
-    for pit in pits:
-        grid[pit[1]][pit[0]] = 'P'
+    for x in xs:
+        for y in ys:
+            if [x, y] in pits:
+                grid[y - y0][x - x0] = 'P'
     
     # Place Luke
-    if luke:
-        grid[luke[1]][luke[0]] = 'L'
+    if luke and luke[0] in xs and luke[1] in ys:
+        grid[luke[1] - y0][luke[0] - x0] = 'L'
     
     # Place R2D2
-    grid[r2d2_location[1]][r2d2_location[0]] = dir_symbols[r2d2_direction]
+    grid[r2d2_location[1] - y0][r2d2_location[0] - x0] = dir_symbols[r2d2_direction]
 
     grid.reverse()
     print("\n" * SPACING)